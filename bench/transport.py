@@ -0,0 +1,123 @@
+"""
+Telegram API transport benchmark
+
+Runs a local fake Telegram API server and times sendMessage calls through
+telebot's default per-thread sessions and through the pooled keep-alive
+Transport, both from long-lived threads (like the polling, worker and busy
+reply threads, steady state) and from a new thread per call (like steps run
+under a deadline). The fake server sleeps on every new connection to stand
+in for the TCP + TLS handshake of the real API.
+
+Usage: python -m bench.transport [calls] [handshake ms]
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+from telebot import TeleBot, apihelper
+
+from models.transport import Transport, TransportConfig
+
+HANDSHAKE = 0.02
+THREADS = 2
+
+
+class FakeTelegram(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self) -> None:
+        super().setup()
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        time.sleep(HANDSHAKE)
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.do_GET()
+
+    def do_GET(self) -> None:
+        message = {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"}, "text": "hi"}
+        body = json.dumps({"ok": True, "result": message}).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+def run(bot: TeleBot, calls: int, new_threads: bool) -> List[float]:
+    """
+    Time sendMessage calls made one after another
+
+    :param bot: TeleBot instance
+    :param calls: number of calls
+    :param new_threads: make every call from a new thread instead of THREADS long-lived threads
+    """
+
+    latencies: List[float] = []
+
+    def call() -> None:
+        start = time.perf_counter()
+        bot.send_message(1, "hi")
+        latencies.append(time.perf_counter() - start)
+
+    if new_threads:
+        for _ in range(calls):
+            thread = threading.Thread(target=call)
+            thread.start()
+            thread.join()
+    else:
+        with ThreadPoolExecutor(THREADS) as executor:
+            for _ in range(calls):
+                executor.submit(call).result()
+
+    return latencies
+
+
+def report(name: str, latencies: List[float]) -> None:
+    latencies = sorted(latencies)
+    mean = sum(latencies) / len(latencies)
+    p95 = latencies[math.ceil(len(latencies) * 0.95) - 1]
+    print(f"{name:<20} mean {mean * 1000:7.2f} ms   p95 {p95 * 1000:7.2f} ms")
+
+
+def main(calls: int) -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTelegram)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url = f"http://127.0.0.1:{server.server_port}/bot{{0}}/{{1}}"
+    bot = TeleBot("1:benchmark", threaded=False)
+    apihelper.API_URL = api_url
+
+    for new_threads, mode in ((False, "long-lived"), (True, "new thread")):
+
+        # Default telebot request path
+        apihelper.CUSTOM_REQUEST_SENDER = None
+        report(f"default {mode}", run(bot, calls, new_threads))
+
+        # Pooled keep-alive transport
+        transport = Transport(TransportConfig(api_url=api_url))
+        transport.install()
+        report(f"pooled {mode}", run(bot, calls, new_threads))
+
+        metrics = transport.metrics
+        print(f"{'':<20} {metrics.requests} requests, {metrics.connections} connections, {metrics.reused} reused")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        HANDSHAKE = float(sys.argv[2]) / 1000
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -1,14 +1,24 @@
 from typing import Any, Optional
 
-from config.secret import DB_NAME, TELEGRAM_KEY
+from config.secret import ADMIN_IDS, DB_NAME, TELEGRAM_KEY
 from models.bot import Bot
 from models.message import Info
 from models.service import Service
-from services.booking import booking_service
+from services.archive import archive_service
+from services.booking import booking_service, reminder_service
+from services.export import export_service
 from services.reset_email import User, email_service
 
 
 def dispatcher(info: Info, service: Optional[Service[Any]]):
+    if info.kind == "timer":
+        if info.timer_service == "reminder":
+            return reminder_service()
+        elif service is not None and service.name == info.timer_service:
+            return service
+        else:
+            return None
+
     user_record = User.find(info.user_id)
 
     if user_record is None:
@@ -17,7 +27,11 @@ def dispatcher(info: Info, service: Optional[Service[Any]]):
         else:
             return email_service()
     else:
-        if info.data is not None and info.data.startswith("/") and info.query is None:
+        if info.data is not None and info.data.startswith("/export") and info.user_id in ADMIN_IDS:
+            return export_service()
+        elif info.data is not None and info.data.startswith("/archive") and info.user_id in ADMIN_IDS:
+            return archive_service()
+        elif info.data is not None and info.data.startswith("/") and info.query is None:
             return booking_service()
         else:
             return service
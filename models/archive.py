@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import datetime as dt
+
+from sqlalchemy import delete, insert, select
+
+from models.settings import Settings
+from models.sql import Booking
+
+
+def archive_bookings(cutoff: dt.date, batch_size: int = 500) -> int:
+    """
+    Moves bookings dated before a cutoff into the booking archive table
+
+    Every batch is moved and committed through the session of the current
+    thread, so the hot table is never locked for long and an interrupted
+    run can simply be repeated.
+
+    :param cutoff: bookings before this date are archived (today at the latest)
+    :param batch_size: bookings moved per transaction
+    :return: number of archived bookings
+    """
+
+    if cutoff > dt.date.today():
+        raise ValueError("Only past bookings can be archived")
+
+    booking = Booking.__table__
+    archive = Booking.__archive__
+    session = Settings.session
+    count = 0
+
+    while True:
+        ids = session.execute(select(booking.c.id).where(booking.c.date < cutoff).limit(batch_size)).scalars().all()
+
+        if not ids:
+            break
+
+        session.execute(
+            insert(archive).from_select(
+                [column.name for column in booking.columns],
+                select(booking).where(booking.c.id.in_(ids)),
+            )
+        )
+        session.execute(delete(booking).where(booking.c.id.in_(ids)))
+        session.commit()
+
+        count += len(ids)
+
+    # Loaded instances may refer to archived rows
+    session.expire_all()
+
+    return count
@@ -1,14 +1,24 @@
 from __future__ import annotations
 
+import logging
+import threading
+import time
 from abc import abstractclassmethod
+from collections import Counter
 from dataclasses import dataclass, field
-from typing import Any, Callable, ClassVar, Dict, Generic, List, Optional, Protocol, Type, TypeVar, Union
+from queue import Full, Queue
+from typing import Any, Callable, ClassVar, Counter as CounterType, Dict, Generic, List, Optional, Protocol, Tuple, Type, TypeVar, Union
 
 from telebot import TeleBot
 from telebot.types import CallbackQuery, ForceReply, InlineKeyboardMarkup, Message, ReplyKeyboardMarkup, ReplyKeyboardRemove
 
+from models.cancel import check_cancelled, step_state
+from models.inbound import PRIORITY_CALLBACK, PRIORITY_COMMAND, PRIORITY_CONVERSATION, InboundQueue, LoadPolicy
 from models.info import Info
+from models.scheduler import Scheduler
 from models.settings import Settings
+from models.tracker import MessageState, MessageTracker, markup_key
+from models.transport import TransportConfig
 
 """
 Type Variables
@@ -20,6 +30,8 @@ _S = TypeVar("_S", covariant=True)
 _T = TypeVar("_T")
 BotClass = Type["Bot"]
 
+logger = logging.getLogger(__name__)
+
 
 class Factory(Protocol[_S]):
     """
@@ -70,6 +82,10 @@ class Service(Generic[_T]):
     :ivar _current_sent: messages sent this step
     :ivar last_expire: expiring messages sent last step
     :ivar _current_expire: expiring messages sent this step
+    :ivar _timeout: deadline (seconds) for every step, None for no deadline
+    :ivar _step_timeouts: per-step deadlines (seconds), overrides _timeout
+    :ivar timeout_text: reply sent when a step is abandoned
+    :cvar timeout_counts: number of abandoned steps by "service.step"
     """
 
     name: str
@@ -82,19 +98,41 @@ class Service(Generic[_T]):
     _current_sent: List[Message] = field(init=False, default_factory=list)
     last_expire: List[Message] = field(init=False, default_factory=list)
     _current_expire: List[Message] = field(init=False, default_factory=list)
+    _timeout: Optional[float] = None
+    _step_timeouts: Dict[str, float] = field(default_factory=dict)
+    timeout_text: str = "That took too long, please try again"
+    timeout_counts: ClassVar[CounterType[str]] = Counter()
 
     def handle(self, info: Info) -> StepResult[_T]:
 
         # Calls current step
-        if self._current_step is None:
+        current_step = self._current_step
+        if info.timer_step is not None:
+            step_name = info.timer_step
+            step = self._steps.get(info.timer_step)
+
+            # Timer for a step the service does not have
+            if step is None:
+                return StepResult[_T](next_step=None, last_step=False, expire_all=False)
+
+        elif self._current_step is None:
+            step_name = "setup"
             step = self._setup
         else:
+            step_name = self._current_step
             step = self._steps.get(self._current_step)
 
         if step is None:
             result = StepResult[_T](next_step=self._current_step, last_step=True)
         else:
-            result = step(Bot, info, self)
+            timeout = self._step_timeouts.get(step_name, self._timeout)
+            watched = self._call(step, info, timeout)
+
+            if watched is None:
+                self._current_step = current_step
+                return self._abandon(step_name, info)
+
+            result = watched
 
         # Expire messages
         if result.expire_all:
@@ -104,8 +142,9 @@ class Service(Generic[_T]):
         self.last_expire.extend(self._current_expire)
         self._current_expire = list()
 
-        # Reset sent messages every step
-        self.last_sent = list()
+        # Reset sent messages every step (timer steps interleave with the current step)
+        if info.timer_step is None:
+            self.last_sent = list()
         self.last_sent.extend(self._current_sent)
         self._current_sent = list()
 
@@ -119,6 +158,80 @@ class Service(Generic[_T]):
 
         return result
 
+    def _call(
+        self,
+        step: Callable[[BotClass, Info, Service[_T]], StepResult[_T]],
+        info: Info,
+        timeout: Optional[float],
+    ) -> Optional[StepResult[_T]]:
+        """
+        Call a step under the step watchdog
+
+        :param step: step function
+        :param info: event info
+        :param timeout: deadline (seconds), None to call the step directly
+        :return: step result, None if the deadline has passed
+        """
+
+        if timeout is None:
+            return step(Bot, info, self)
+
+        cancelled = threading.Event()
+        outcome: Dict[str, Any] = {}
+
+        # The step gets its own session, an abandoned step rolls it back when it ends
+        def target() -> None:
+            step_state.cancelled = cancelled
+            try:
+                outcome["result"] = step(Bot, info, self)
+            except BaseException as e:
+                outcome["error"] = e
+            finally:
+                Settings.close_session()
+
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        thread.join(timeout)
+
+        # Abandon the step (the thread cannot be killed, but it can no longer send, save or schedule)
+        if thread.is_alive():
+            cancelled.set()
+
+            # The user stays busy until the thread ends (see Bot.release)
+            abandoned: Optional[List[threading.Thread]] = getattr(step_state, "abandoned", None)
+            if abandoned is not None:
+                abandoned.append(thread)
+
+            return None
+
+        if "error" in outcome:
+            raise outcome["error"]
+
+        return outcome["result"]
+
+    def _abandon(self, step_name: str, info: Info) -> StepResult[_T]:
+        """
+        Forget an abandoned step and inform the user
+
+        :param step_name: abandoned step
+        :param info: event info
+        """
+
+        Service.timeout_counts[f"{self.name}.{step_name}"] += 1
+
+        # Keep expiring messages, forget the rest of the step's messages
+        self.last_expire.extend(self._current_expire)
+        self._current_expire = list()
+        self._current_sent = list()
+
+        try:
+            Bot.send(self.timeout_text, info.chat_id, markup=None)
+        except Exception:
+            pass
+
+        # Stay on the same step
+        return StepResult[_T](next_step=None, last_step=False, expire_all=False)
+
     def send(
         self,
         text: Optional[str],
@@ -155,15 +268,35 @@ class Service(Generic[_T]):
         """
         Reend a message
 
+        Edits the previous message back to its original content if it is still
+        tracked (nothing is sent if it did not change), otherwise sends a new one.
+
         :param message: previous message
         :param expire: whether the message should expire by next step
         """
-        return self.send(
-            message.text,
-            message.chat.id,
-            message.reply_markup,
-            expire=expire,
-        )
+
+        markup = message.reply_markup
+        editable = markup is None or isinstance(markup, InlineKeyboardMarkup)
+
+        if not editable or Bot.messages.get((message.chat.id, message.id)) is None:
+            return self.send(
+                message.text,
+                message.chat.id,
+                markup,
+                expire=expire,
+            )
+
+        Bot.edit(message.text, message.chat.id, message.id, markup=markup)
+
+        # Keep the message alive instead of expiring it
+        self.last_expire = [msg for msg in self.last_expire if (msg.chat.id, msg.id) != (message.chat.id, message.id)]
+
+        self._current_sent.append(message)
+
+        if expire:
+            self._current_expire.append(message)
+
+        return message
 
     def clear_expire(self) -> None:
         """Clears the list of expiring messages"""
@@ -186,22 +319,38 @@ def service_factory(
     setup: Callable[[BotClass, Info, Service[_T]], StepResult[_T]],
     steps: Dict[str, Callable[[BotClass, Info, Service[_T]], StepResult[_T]]] = {},
     cleanup: Optional[Callable[[Service[_T]], None]] = None,
+    timeout: Optional[float] = None,
+    step_timeouts: Dict[str, float] = {},
 ) -> Factory[Service[_T]]:
     """
     Creates a factory method to construct an empty service
 
     :param steps: service steps
     :param data_factory: factory method / class for service data
+    :param timeout: deadline (seconds) for every step
+    :param step_timeouts: per-step deadlines (seconds), "setup" for the setup step
     """
 
     def factory():
-        return Service[_T](name=name, _setup=setup, _steps=steps, _cleanup=cleanup)
+        return Service[_T](
+            name=name,
+            _setup=setup,
+            _steps=steps,
+            _cleanup=cleanup,
+            _timeout=timeout,
+            _step_timeouts=step_timeouts,
+        )
 
     return factory
 
 
 class Bot:
     bot: ClassVar[TeleBot]
+    queue: ClassVar[InboundQueue[Union[Message, CallbackQuery, Info]]]
+    busy: ClassVar["Queue[Tuple[str, Union[Message, CallbackQuery]]]"]
+    _busy_replied: ClassVar[Dict[int, float]] = {}
+    _busy_lock: ClassVar[threading.Lock] = threading.Lock()
+    messages: ClassVar[MessageTracker] = MessageTracker()
     active_services: ClassVar[Dict[int, "Service[Any]"]] = {}
 
     @classmethod
@@ -213,6 +362,8 @@ class Bot:
             [Info, Optional["Service[Any]"]],
             Optional["Service[Any]"],
         ] = lambda x, y: None,
+        policy: Optional[LoadPolicy] = None,
+        transport: Optional[TransportConfig] = None,
     ) -> None:
         """
         Start the Telegram Bot
@@ -220,6 +371,8 @@ class Bot:
         :param token: Telegram API key
         :param db_name: SQLite database filename
         :param dispatcher: dispatcher function (maps event to Service)
+        :param policy: inbound queue and load shedding policy
+        :param transport: Telegram API HTTP transport settings
         """
 
         # Override default dispatcher
@@ -227,34 +380,197 @@ class Bot:
             setattr(cls, "dispatcher", dispatcher)
 
         # Set up Telegram and SQLite connections
-        Settings.start(token=token, db_name=db_name)
+        Settings.start(token=token, db_name=db_name, transport=transport)
         cls.bot = Settings.bot
 
+        # Set up inbound queue and its workers
+        cls.queue = InboundQueue(LoadPolicy() if policy is None else policy)
+        for _ in range(cls.queue.policy.workers):
+            threading.Thread(target=cls.worker, daemon=True).start()
+
+        # Busy replies are sent off the polling thread
+        cls.busy = Queue(cls.queue.policy.busy_backlog)
+        threading.Thread(target=cls.busy_worker, daemon=True).start()
+
+        # Start delivering timers into the inbound queue
+        Scheduler.start(deliver=cls.submit)
+
         # Set up catch-all message handler
-        cls.bot.message_handler(func=lambda _: True)(cls.handler)
+        cls.bot.message_handler(func=lambda _: True)(cls.enqueue)
 
         # Set up catch-all callback handler
-        cls.bot.callback_query_handler(func=lambda _: True)(cls.handler)
+        cls.bot.callback_query_handler(func=lambda _: True)(cls.enqueue)
 
         # Start polling
         cls.bot.polling()
 
     @classmethod
-    def handler(cls, data: Union[Message, CallbackQuery]):
+    def enqueue(cls, data: Union[Message, CallbackQuery]) -> None:
         """
-        Event (Message / CallbackQuery) handler
+        Queue an event (Message / CallbackQuery) for the handler
 
         :param data: Message / CallbackQuery
         """
 
+        try:
+            info = Info.parse(data)
+
+            # Button presses first, then ongoing conversations, then new commands
+            if info.query is not None:
+                priority = PRIORITY_CALLBACK
+            elif info.user_id in cls.active_services and not (info.data or "").startswith("/"):
+                priority = PRIORITY_CONVERSATION
+            else:
+                priority = PRIORITY_COMMAND
+
+            shed = cls.queue.put(info.user_id, priority, data)
+
+            if shed is not None:
+                cls.shed(*shed)
+
+        except Exception:
+            logger.exception("Error while queueing event")
+
+    @classmethod
+    def submit(cls, info: Info) -> None:
+        """
+        Queue an event that did not come from Telegram (e.g. a due timer)
+
+        :param info: event info
+        """
+
+        shed = cls.queue.put(info.user_id, PRIORITY_CONVERSATION, info, limit=False)
+
+        if shed is not None:
+            cls.shed(*shed)
+
+    @classmethod
+    def shed(cls, reason: str, data: Union[Message, CallbackQuery, Info]) -> None:
+        """
+        Queue a busy reply to an event dropped by the inbound queue
+
+        :param reason: "full" / "flood"
+        :param data: Message / CallbackQuery
+        """
+
+        # Timers are never dropped, they are delivered again later
+        if isinstance(data, Info):
+            if data.kind == "timer":
+                Scheduler.retry(data.id)
+            return
+
+        policy = cls.queue.policy
+
+        # Flooding users get no reply (it would only feed the flood)
+        if policy.busy_text is None or reason == "flood":
+            return
+
+        # At most one busy reply per user every busy_interval, dropped when the backlog is full
+        user_id = data.from_user.id
+        now = time.monotonic()
+
+        with cls._busy_lock:
+            last = cls._busy_replied.get(user_id)
+            if last is not None and now - last < policy.busy_interval:
+                return
+
+            try:
+                cls.busy.put_nowait((policy.busy_text, data))
+            except Full:
+                return
+
+            cls._busy_replied[user_id] = now
+
+            # Forget users whose interval has passed
+            if len(cls._busy_replied) > policy.busy_backlog:
+                cls._busy_replied = {
+                    replied: at for replied, at in cls._busy_replied.items() if now - at < policy.busy_interval
+                }
+
+    @classmethod
+    def busy_worker(cls) -> None:
+        """Busy reply loop (answers shed events queued by shed)"""
+
+        while True:
+            busy_text, data = cls.busy.get()
+
+            try:
+                if isinstance(data, Message):
+                    cls.send(busy_text, data.chat.id, markup=None)
+                else:
+                    cls.bot.answer_callback_query(data.id, busy_text)
+            except Exception:
+                logger.exception("Error while replying to shed event")
+
+    @classmethod
+    def worker(cls) -> None:
+        """Inbound queue worker loop"""
+
+        while True:
+            user_id, data = cls.queue.get()
+            step_state.abandoned = []
+
+            try:
+                cls.handler(data)
+            except Exception:
+                logger.exception("Unhandled error in inbound worker")
+            finally:
+                cls.release(user_id, step_state.abandoned)
+
+    @classmethod
+    def release(cls, user_id: int, abandoned: List[threading.Thread]) -> None:
+        """
+        Mark the event of a user as handled once its abandoned steps have ended
+
+        An abandoned step may still be changing the user's service, so the
+        next event of the user waits for it (other users are not held up).
+
+        :param user_id: user id
+        :param abandoned: step threads abandoned while handling the event
+        """
+
+        if not abandoned:
+            cls.queue.done(user_id)
+            return
+
+        def wait() -> None:
+            for thread in abandoned:
+                thread.join()
+            cls.queue.done(user_id)
+
+        threading.Thread(target=wait, daemon=True).start()
+
+    @classmethod
+    def handler(cls, data: Union[Message, CallbackQuery, Info]):
+        """
+        Event (Message / CallbackQuery / timer Info) handler
+
+        :param data: Message / CallbackQuery / timer Info
+        """
+
         try:
 
             # Parse message / callback info
-            info = Info.parse(data)
+            info = data if isinstance(data, Info) else Info.parse(data)
 
             # Get currently active service
             active_service = cls.active_services.get(info.user_id)
 
+            # Timers never replace the active service of the user
+            if info.kind == "timer":
+                try:
+                    next_service = cls.dispatcher(info, active_service)
+
+                    if next_service is not None and Scheduler.pending(info.id):
+                        result = next_service.handle(info)
+
+                        if result.last_step and next_service is active_service:
+                            cls.active_services.pop(info.user_id, None)
+                finally:
+                    # Remove the timer once handled (even if dispatching or handling failed)
+                    Scheduler.done(info.id)
+                return
+
             # Get next active service (usually only changes when new command is received)
             next_service = cls.dispatcher(info, active_service)
 
@@ -275,10 +591,20 @@ class Bot:
                     cls.active_services.pop(info.user_id, None)
 
         except Exception:
-            if isinstance(data, Message):
-                cls.send("Something went wrong :(", data.chat.id)
-            else:
-                cls.send("Something went wrong :(", data.message.chat.id)
+            logger.exception("Error while handling event")
+
+            # Replying may fail as well (e.g. the user blocked the bot)
+            try:
+                if isinstance(data, Message):
+                    cls.send("Something went wrong :(", data.chat.id)
+                elif isinstance(data, CallbackQuery):
+                    cls.send("Something went wrong :(", data.message.chat.id)
+            except Exception:
+                logger.exception("Error while replying to failed event")
+
+        finally:
+            # Every event is its own unit of work (releases SQLite's write lock)
+            Settings.close_session()
 
     @classmethod
     def dispatcher(
@@ -311,12 +637,48 @@ class Bot:
         :param markup: message markup
         """
 
+        check_cancelled()
         msg = cls.bot.send_message(
             chat_id=chat_id,
             text="" if text is None else text,
             reply_markup=markup,
             **kwargs,
         )
+
+        cls.messages.update((chat_id, msg.message_id), MessageState("" if text is None else text, markup_key(markup)))
+
+        # The step may have been abandoned while waiting for Telegram
+        check_cancelled()
+
+        return msg
+
+    @classmethod
+    def send_document(
+        cls,
+        document: Any,
+        chat_id: int,
+        caption: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Message:
+        """
+        Send a document
+
+        :param document: file object / file id
+        :param chat_id: chat id
+        :param caption: document caption
+        """
+
+        check_cancelled()
+        msg = cls.bot.send_document(
+            chat_id=chat_id,
+            document=document,
+            caption=caption,
+            **kwargs,
+        )
+
+        # The step may have been abandoned while waiting for Telegram
+        check_cancelled()
+
         return msg
 
     @classmethod
@@ -343,10 +705,32 @@ class Bot:
         :param markup: message markup
         """
 
-        cls.bot.edit_message_text(
-            text="" if text is None else text,
-            chat_id=chat_id,
-            message_id=message_id,
-            reply_markup=markup,
-            **kwargs,
-        )
+        check_cancelled()
+        state = MessageState("" if text is None else text, markup_key(markup))
+        key = None if chat_id is None or message_id is None else (chat_id, message_id)
+        last = None if key is None else cls.messages.get(key)
+
+        # Nothing changed (Telegram would reply "message is not modified")
+        if last == state:
+            return
+
+        if last is not None and last.text == state.text:
+            cls.bot.edit_message_reply_markup(
+                chat_id=chat_id,
+                message_id=message_id,
+                reply_markup=markup,
+            )
+        else:
+            cls.bot.edit_message_text(
+                text=state.text,
+                chat_id=chat_id,
+                message_id=message_id,
+                reply_markup=markup,
+                **kwargs,
+            )
+
+        if key is not None:
+            cls.messages.update(key, state)
+
+        # The step may have been abandoned while waiting for Telegram
+        check_cancelled()
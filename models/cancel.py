@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import threading
+from typing import Optional
+
+# Step watchdog state of the current thread:
+#   cancelled: cancellation event of the step running in this thread (set by the step watchdog)
+#   abandoned: step threads abandoned while handling the current event (still running)
+step_state = threading.local()
+
+
+class StepTimeout(Exception):
+    """Raised inside a step that was abandoned by the step watchdog"""
+
+
+def check_cancelled() -> None:
+    """Raises StepTimeout if the step running in the current thread was abandoned"""
+
+    cancelled: Optional[threading.Event] = getattr(step_state, "cancelled", None)
+    if cancelled is not None and cancelled.is_set():
+        raise StepTimeout("Step was abandoned")
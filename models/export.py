@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import csv
+import datetime as dt
+import json
+from typing import Any, Optional, TextIO, Tuple
+
+from sqlalchemy import select, union_all
+
+from models.settings import Settings
+from models.sql import Booking, User
+
+"""
+Export formats and columns
+
+FORMATS: supported export formats
+COLUMNS: exported columns (booking joined with its user)
+"""
+FORMATS = ("csv", "json")
+COLUMNS = ("id", "date", "n_pax", "purpose", "user_id", "username", "email")
+
+
+def _plain(value: Any) -> Any:
+    """Converts dates to ISO strings"""
+    return value.isoformat() if isinstance(value, dt.date) else value
+
+
+def export_bookings(
+    fp: TextIO,
+    fmt: str = "csv",
+    start: Optional[dt.date] = None,
+    end: Optional[dt.date] = None,
+    chunk_size: int = 500,
+    include_archived: bool = False,
+) -> int:
+    """
+    Streams bookings joined with their users into a file
+
+    Rows are fetched chunk by chunk as plain tuples (no ORM instances) and
+    written as they arrive, so memory use does not grow with the number of rows.
+
+    :param fp: text file to write to
+    :param fmt: "csv" / "json"
+    :param start: earliest booking date (inclusive)
+    :param end: latest booking date (inclusive)
+    :param chunk_size: rows fetched per chunk
+    :param include_archived: whether archived bookings are exported as well
+    :return: number of exported rows
+    """
+
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt}")
+
+    booking = Booking.__table__
+    user = User.__table__
+
+    if include_archived and Booking.__archive__ is not None:
+        booking = union_all(select(booking), select(Booking.__archive__)).subquery()
+
+    query = (
+        select(
+            booking.c.id,
+            booking.c.date,
+            booking.c.n_pax,
+            booking.c.purpose,
+            user.c.id,
+            user.c.username,
+            user.c.email,
+        )
+        .select_from(booking.join(user, booking.c.user_id == user.c.id))
+        .order_by(booking.c.date, booking.c.id)
+    )
+    if start is not None:
+        query = query.where(booking.c.date >= start)
+    if end is not None:
+        query = query.where(booking.c.date <= end)
+
+    count = 0
+    writer = csv.writer(fp)
+
+    if fmt == "csv":
+        writer.writerow(COLUMNS)
+    else:
+        fp.write("[")
+
+    with Settings.engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, max_row_buffer=chunk_size).execute(query)
+
+        for chunk in result.partitions(chunk_size):
+            for row in chunk:
+                values: Tuple[Any, ...] = tuple(_plain(value) for value in row)
+
+                if fmt == "csv":
+                    writer.writerow(values)
+                else:
+                    fp.write(("\n" if count == 0 else ",\n") + json.dumps(dict(zip(COLUMNS, values))))
+
+                count += 1
+
+    if fmt == "json":
+        fp.write("\n]\n")
+
+    return count
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import heapq
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Generic, List, Optional, Set, Tuple, TypeVar
+
+_T = TypeVar("_T")
+
+"""
+Event priorities (lower is served first)
+
+PRIORITY_CALLBACK: callback queries (button presses on messages already sent)
+PRIORITY_CONVERSATION: messages for a user with an active service
+PRIORITY_COMMAND: new commands / messages without an active service
+PRIORITY_FLOOD: any event from a user exceeding the flood limit
+"""
+PRIORITY_CALLBACK = 0
+PRIORITY_CONVERSATION = 1
+PRIORITY_COMMAND = 2
+PRIORITY_FLOOD = 3
+
+# Idle (full) flood buckets are pruned every PRUNE_EVERY queued events
+PRUNE_EVERY = 1000
+
+
+@dataclass
+class LoadPolicy:
+    """
+    Inbound queue and load shedding policy
+
+    :ivar max_size: maximum number of queued events
+    :ivar workers: number of worker threads draining the queue
+    :ivar flood_rate: events per second allowed per user (sustained)
+    :ivar flood_burst: events allowed per user in a burst
+    :ivar busy_text: reply sent when an event is shed (None to shed silently)
+    :ivar busy_interval: minimum time (seconds) between busy replies to the same user
+    :ivar busy_backlog: maximum number of busy replies waiting to be sent (more are not sent)
+    """
+
+    max_size: int = 1000
+    workers: int = 1
+    flood_rate: float = 1.0
+    flood_burst: int = 5
+    busy_text: Optional[str] = "Busy, try again later"
+    busy_interval: float = 30.0
+    busy_backlog: int = 100
+
+
+@dataclass
+class QueueMetrics:
+    """
+    Inbound queue metrics
+
+    :ivar depth: current number of queued events
+    :ivar max_depth: highest number of queued events seen
+    :ivar enqueued: number of events accepted into the queue
+    :ivar dequeued: number of events handed to workers
+    :ivar shed: number of shed events by reason ("full" / "flood")
+    """
+
+    depth: int = 0
+    max_depth: int = 0
+    enqueued: int = 0
+    dequeued: int = 0
+    shed: Counter[str] = field(default_factory=Counter)
+
+
+@dataclass
+class InboundQueue(Generic[_T]):
+    """
+    Bounded priority queue for inbound events
+
+    When full, the worst queued event (flooding users first, then new
+    commands, newest first) is shed to make room for a better one.
+    Events of a user are never handed to two workers at once.
+
+    :ivar policy: load shedding policy
+    :ivar metrics: queue metrics
+    :ivar _heap: queued (priority, sequence, user id, item) entries
+    :ivar _buckets: per-user flood token buckets (tokens, last refill time)
+    :ivar _busy: users whose event is being handled by a worker
+    :ivar _seq: sequence number of the next entry
+    :ivar _cond: condition guarding the queue
+    """
+
+    policy: LoadPolicy = field(default_factory=LoadPolicy)
+    metrics: QueueMetrics = field(init=False, default_factory=QueueMetrics)
+    _heap: List[Tuple[int, int, int, _T]] = field(init=False, default_factory=list)
+    _buckets: Dict[int, Tuple[float, float]] = field(init=False, default_factory=dict)
+    _busy: Set[int] = field(init=False, default_factory=set)
+    _seq: int = field(init=False, default=0)
+    _cond: threading.Condition = field(init=False, default_factory=threading.Condition)
+
+    def put(self, user_id: int, priority: int, item: _T, limit: bool = True) -> Optional[Tuple[str, _T]]:
+        """
+        Queue an event
+
+        :param user_id: user id (for flood limits)
+        :param priority: event priority
+        :param item: event
+        :param limit: whether the event counts towards the user's flood limit
+        :return: (reason, event) of the shed event if any
+        """
+
+        with self._cond:
+
+            # Events of flooding users go to the back of the line
+            if limit and self._flooding(user_id):
+                priority = PRIORITY_FLOOD
+
+            entry = (priority, self._seq, user_id, item)
+            self._seq += 1
+
+            if self._seq % PRUNE_EVERY == 0:
+                self._prune()
+
+            # Shed the worst of the queued events and the new event when full
+            shed: Optional[Tuple[int, int, int, _T]] = None
+            if len(self._heap) >= self.policy.max_size:
+                worst = max(self._heap)
+                if entry > worst:
+                    shed = entry
+                else:
+                    self._heap.remove(worst)
+                    heapq.heapify(self._heap)
+                    shed = worst
+
+            if shed is not entry:
+                heapq.heappush(self._heap, entry)
+                self.metrics.enqueued += 1
+                self._cond.notify_all()
+
+            self.metrics.depth = len(self._heap)
+            self.metrics.max_depth = max(self.metrics.max_depth, self.metrics.depth)
+
+            if shed is None:
+                return None
+
+            reason = "flood" if shed[0] == PRIORITY_FLOOD else "full"
+            self.metrics.shed[reason] += 1
+            return reason, shed[3]
+
+    def get(self) -> Tuple[int, _T]:
+        """
+        Wait for and remove the next event of a user not being handled
+
+        The user stays busy until done is called.
+
+        :return: (user id, event)
+        """
+
+        with self._cond:
+            while True:
+                entry = self._next()
+                if entry is not None:
+                    break
+                self._cond.wait()
+
+            _, _, user_id, item = entry
+            self._busy.add(user_id)
+            self.metrics.depth = len(self._heap)
+            self.metrics.dequeued += 1
+            return user_id, item
+
+    def done(self, user_id: int) -> None:
+        """
+        Mark the event of a user returned by get as handled
+
+        :param user_id: user id
+        """
+
+        with self._cond:
+            self._busy.discard(user_id)
+            self._cond.notify_all()
+
+    def _next(self) -> Optional[Tuple[int, int, int, _T]]:
+        """Remove the best entry of a user that is not busy (caller holds _cond)"""
+
+        skipped: List[Tuple[int, int, int, _T]] = []
+        entry = None
+
+        while self._heap:
+            candidate = heapq.heappop(self._heap)
+            if candidate[2] not in self._busy:
+                entry = candidate
+                break
+            skipped.append(candidate)
+
+        for candidate in skipped:
+            heapq.heappush(self._heap, candidate)
+
+        return entry
+
+    def _flooding(self, user_id: int) -> bool:
+        """
+        Take a token from the user's bucket
+
+        :param user_id: user id
+        :return: whether the user is over the flood limit
+        """
+
+        now = time.monotonic()
+        tokens, last = self._buckets.get(user_id, (float(self.policy.flood_burst), now))
+        tokens = min(float(self.policy.flood_burst), tokens + (now - last) * self.policy.flood_rate)
+
+        if tokens < 1:
+            self._buckets[user_id] = (tokens, now)
+            return True
+
+        self._buckets[user_id] = (tokens - 1, now)
+        return False
+
+    def _prune(self) -> None:
+        """Forget buckets that have refilled (same as a user never seen)"""
+
+        now = time.monotonic()
+        burst = float(self.policy.flood_burst)
+
+        self._buckets = {
+            user_id: (tokens, last)
+            for user_id, (tokens, last) in self._buckets.items()
+            if tokens + (now - last) * self.policy.flood_rate < burst
+        }
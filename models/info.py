@@ -23,6 +23,8 @@ class Info:
     :ivar sent: message sent time / callback query sent message sent time
     :ivar message: message / callback query sent message
     :ivar query: None / callback query
+    :ivar timer_service: None / service the timer was scheduled for
+    :ivar timer_step: None / service step the timer fires (None for setup)
     """
 
     id: int
@@ -36,6 +38,8 @@ class Info:
     sent: datetime
     message: Optional[Message] = None
     query: Optional[CallbackQuery] = None
+    timer_service: Optional[str] = None
+    timer_step: Optional[str] = None
 
     @classmethod
     def parse(cls, item: Union[Message, CallbackQuery]):
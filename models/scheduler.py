@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, ClassVar, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+
+from models.cancel import check_cancelled
+from models.info import Info
+from models.settings import Settings
+from models.sql import Timer
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """
+    Persistent timer scheduler
+
+    Timers are stored in the timer table, only timers due within the next
+    window are kept in an in-memory heap. Due timers are delivered as
+    "timer" events (see Info.timer_service / Info.timer_step) and are only
+    removed from the table once handled (done), so a timer that is shed or
+    lost in a crash is delivered again.
+
+    :cvar window: how far ahead timers are loaded into memory
+    :cvar retry_delay: delay before a shed timer or a failed scheduler step is retried
+    :cvar _heap: loaded (due, timer id) entries
+    :cvar _loaded: ids of the timers in the heap
+    :cvar _loaded_until: timers due up to this time are loaded
+    :cvar _cond: condition guarding the heap (notified on new near-term timers)
+    :cvar _deliver: called with the event of every due timer
+    """
+
+    window: ClassVar[timedelta] = timedelta(minutes=10)
+    retry_delay: ClassVar[timedelta] = timedelta(seconds=5)
+    _heap: ClassVar[List[Tuple[datetime, int]]] = []
+    _loaded: ClassVar[Set[int]] = set()
+    _loaded_until: ClassVar[datetime] = datetime.min
+    _cond: ClassVar[threading.Condition] = threading.Condition()
+    _deliver: ClassVar[Optional[Callable[[Info], None]]] = None
+
+    @classmethod
+    def start(cls, deliver: Callable[[Info], None], window: Optional[timedelta] = None) -> None:
+        """
+        Start the scheduler thread
+
+        :param deliver: called with the event of every due timer
+        :param window: how far ahead timers are loaded into memory
+        """
+
+        cls._deliver = deliver
+        if window is not None:
+            cls.window = window
+
+        threading.Thread(target=cls.run, daemon=True).start()
+
+    @classmethod
+    def schedule(
+        cls,
+        due: datetime,
+        user_id: int,
+        chat_id: int,
+        service: str,
+        step: Optional[str] = None,
+        data: Optional[str] = None,
+    ) -> int:
+        """
+        Schedule a timer (commits the session of the current thread)
+
+        :param due: time the timer fires
+        :param user_id: user id
+        :param chat_id: chat id
+        :param service: service name the timer is delivered to
+        :param step: service step to call (None for setup)
+        :param data: event data
+        :return: timer id
+        """
+
+        timer = Timer()
+        timer.user_id = user_id
+        timer.chat_id = chat_id
+        timer.service = service
+        timer.step = step
+        timer.due = due
+        timer.data = data
+        timer.save()
+
+        # Timers beyond the loaded window are picked up by the next load
+        cls._push(due, timer.id)
+
+        return timer.id
+
+    @classmethod
+    def cancel(cls, user_id: int, service: str, step: Optional[str] = None) -> None:
+        """
+        Cancel pending timers (commits the session of the current thread)
+
+        :param user_id: user id
+        :param service: service name
+        :param step: service step (None for all steps)
+        """
+
+        check_cancelled()
+
+        query = Timer.query().filter_by(user_id=user_id, service=service)
+        if step is not None:
+            query = query.filter_by(step=step)
+
+        query.delete(synchronize_session=False)
+        Settings.session.commit()
+
+    @classmethod
+    def pending(cls, id_: int) -> bool:
+        """
+        Whether a timer is still pending (not cancelled or done)
+
+        :param id_: timer id
+        """
+
+        return Timer.find(id_) is not None
+
+    @classmethod
+    def done(cls, id_: int) -> None:
+        """
+        Remove a handled timer (commits the session of the current thread)
+
+        :param id_: timer id
+        """
+
+        Timer.query().filter_by(id=id_).delete(synchronize_session=False)
+        Settings.session.commit()
+
+    @classmethod
+    def retry(cls, id_: int) -> None:
+        """
+        Deliver a timer again after retry_delay (e.g. when its event was shed)
+
+        :param id_: timer id
+        """
+
+        cls._push(datetime.now() + cls.retry_delay, id_, force=True)
+
+    @classmethod
+    def run(cls) -> None:
+        """Scheduler loop"""
+
+        while True:
+            try:
+                cls._step()
+            except Exception:
+                logger.exception("Scheduler error, retrying in %s", cls.retry_delay)
+                time.sleep(cls.retry_delay.total_seconds())
+            finally:
+                Settings.close_session()
+
+    @classmethod
+    def _step(cls) -> None:
+        """Load the next window if needed, then fire one due timer or wait"""
+
+        now = datetime.now()
+
+        # Load the next window before the current one runs out
+        if cls._loaded_until <= now + cls.window / 2:
+            cls._load(now + cls.window)
+
+        with cls._cond:
+            if not cls._heap or cls._heap[0][0] > now:
+                wake = cls._loaded_until - cls.window / 2
+                if cls._heap:
+                    wake = min(wake, cls._heap[0][0])
+                cls._cond.wait(max((wake - now).total_seconds(), 0))
+                return
+
+            _, id_ = heapq.heappop(cls._heap)
+            cls._loaded.discard(id_)
+
+        try:
+            cls._fire(id_)
+        except Exception:
+            # Keep the timer, it is retried
+            cls.retry(id_)
+            raise
+
+    @classmethod
+    def _push(cls, due: datetime, id_: int, force: bool = False) -> None:
+        """
+        Add a timer to the heap if it is due within the loaded window
+
+        :param due: time the timer fires
+        :param id_: timer id
+        :param force: add even if it is due beyond the loaded window
+        """
+
+        with cls._cond:
+            if id_ in cls._loaded or (due > cls._loaded_until and not force):
+                return
+
+            heapq.heappush(cls._heap, (due, id_))
+            cls._loaded.add(id_)
+            cls._cond.notify()
+
+    @classmethod
+    def _load(cls, until: datetime) -> None:
+        """
+        Load timers due up to a time into the heap
+
+        The query runs without holding _cond, so schedule / retry never wait
+        for it. The window is extended first, so timers scheduled meanwhile
+        are pushed by schedule (timers found by both are only added once).
+
+        :param until: load timers due up to this time
+        """
+
+        with cls._cond:
+            since = cls._loaded_until
+            cls._loaded_until = until
+
+        table = Timer.__table__
+        query = select(table.c.due, table.c.id).where(table.c.due > since, table.c.due <= until)
+
+        try:
+            rows = Settings.session.execute(query).all()
+        except Exception:
+            # Load the window again next step
+            with cls._cond:
+                cls._loaded_until = since
+            raise
+        finally:
+            Settings.close_session()
+
+        with cls._cond:
+            for due, id_ in rows:
+                if id_ not in cls._loaded:
+                    heapq.heappush(cls._heap, (due, id_))
+                    cls._loaded.add(id_)
+
+    @classmethod
+    def _fire(cls, id_: int) -> None:
+        """
+        Deliver the event of a due timer (it stays in the table until done)
+
+        :param id_: timer id
+        """
+
+        timer = Timer.find(id_)
+        Settings.close_session()
+
+        # Cancelled or already handled
+        if timer is None or cls._deliver is None:
+            return
+
+        cls._deliver(
+            Info(
+                id=timer.id,
+                chat_id=timer.chat_id,
+                message_id=0,
+                user_id=timer.user_id,
+                username=None,
+                kind="timer",
+                data=timer.data,
+                sent=timer.due,
+                timer_service=timer.service,
+                timer_step=timer.step,
+            )
+        )
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import threading
 from datetime import datetime
 from typing import ClassVar, Optional
 
@@ -9,6 +10,8 @@ from sqlalchemy.orm import registry, sessionmaker
 from sqlalchemy.orm.session import Session
 from telebot import TeleBot
 
+from models.transport import Transport, TransportConfig
+
 mapper_registry = registry()
 sql_map = mapper_registry.mapped
 
@@ -18,24 +21,34 @@ class Settings:
     _db_name: ClassVar[Optional[str]] = None
     _bot: ClassVar[Optional[TeleBot]] = None
     _engine: ClassVar[Optional[Engine]] = None
-    _session: ClassVar[Optional[Session]] = None
+    _sessionmaker: ClassVar[Optional[sessionmaker[Session]]] = None
+    _local: ClassVar[threading.local] = threading.local()
+    _transport: ClassVar[Optional[Transport]] = None
     start_time: ClassVar[datetime] = datetime.now()
 
     @classmethod
-    def start(cls, token: str, db_name: str) -> None:
+    def start(cls, token: str, db_name: str, transport: Optional[TransportConfig] = None) -> None:
         """
         Starts TeleBot and SQLite connection
 
         :param token: Telegram API key
         :param db_name: SQLite database filename
+        :param transport: Telegram API HTTP transport settings
         """
 
         cls._token = token
         cls._db_name = db_name
-        cls._bot = TeleBot(token, parse_mode="MARKDOWN")
+        cls._transport = Transport(TransportConfig() if transport is None else transport)
+        cls._transport.install()
+        # Updates are only queued on intake (see Bot.enqueue), so the polling thread handles them itself
+        cls._bot = TeleBot(token, parse_mode="MARKDOWN", threaded=False)
         engine = create_engine(f"sqlite:///{db_name}", connect_args={"check_same_thread": False})
         cls._engine = engine
-        cls._session = sessionmaker(engine)()
+
+        # Write-ahead log: long reads (e.g. exports) do not block writers
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        cls._sessionmaker = sessionmaker(engine, expire_on_commit=False)
         mapper_registry.metadata.create_all(engine)
 
     @classmethod
@@ -68,6 +81,16 @@ class Settings:
         else:
             raise ValueError("Bot is not set.")
 
+    @classmethod
+    @property
+    def transport(cls) -> Transport:
+        """Telegram API HTTP transport"""
+
+        if cls._transport is not None:
+            return cls._transport
+        else:
+            raise ValueError("Transport is not set.")
+
     @classmethod
     @property
     def engine(cls) -> Engine:
@@ -81,9 +104,28 @@ class Settings:
     @classmethod
     @property
     def session(cls) -> Session:
-        """SQLAlchemy session"""
+        """SQLAlchemy session of the current thread (created on first use)"""
 
-        if cls._session is not None:
-            return cls._session
-        else:
+        if cls._sessionmaker is None:
             raise ValueError("Session is not set.")
+
+        session: Optional[Session] = getattr(cls._local, "session", None)
+        if session is None:
+            session = cls._sessionmaker()
+            cls._local.session = session
+
+        return session
+
+    @classmethod
+    def close_session(cls) -> None:
+        """
+        Closes the session of the current thread
+
+        Uncommitted changes are rolled back (releasing SQLite's write lock)
+        and loaded objects are detached, so they can be saved from another thread.
+        """
+
+        session: Optional[Session] = getattr(cls._local, "session", None)
+        if session is not None:
+            session.close()
+            cls._local.session = None
@@ -2,14 +2,16 @@ from __future__ import annotations
 
 import datetime as dt
 from dataclasses import dataclass, field
-from typing import Any, List, Optional, Type, TypeVar
+from typing import Any, List, Optional, Type, TypeVar, cast
 
-from sqlalchemy.orm import relationship
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import aliased, relationship
 from sqlalchemy.orm.query import Query
-from sqlalchemy.sql.schema import Column, ForeignKey
-from sqlalchemy.sql.sqltypes import Date, Integer, String
+from sqlalchemy.sql.schema import Column, ForeignKey, Table
+from sqlalchemy.sql.sqltypes import Date, DateTime, Integer, String
 from sqlalchemy.sql.type_api import TypeEngine
 
+from models.cancel import check_cancelled
 from models.settings import Settings, sql_map
 
 _T = TypeVar("_T")
@@ -19,12 +21,12 @@ def Id(**kwargs: Any):
     return field(init=False, **kwargs, metadata={"sa": Column(Integer, primary_key=True)})
 
 
-def Field(field_type: TypeEngine[Any], **kwargs: Any):
+def Field(field_type: TypeEngine[Any], index: bool = False, **kwargs: Any):
     return field(
         init=False,
         default=None,
         **kwargs,
-        metadata={"sa": Column(field_type)},
+        metadata={"sa": Column(field_type, index=index)},
     )
 
 
@@ -47,12 +49,28 @@ def Relationship(table: str, backref: str, **kwargs: Any) -> List[Any]:
     return field_
 
 
+def Archive(table: Table) -> Table:
+    """
+    Creates an archive table with the same columns ("<table>_archive")
+
+    :param table: hot table
+    """
+
+    return Table(
+        f"{table.name}_archive",
+        table.metadata,
+        *[Column(column.name, column.type, primary_key=column.primary_key, index=column.index) for column in table.columns],
+    )
+
+
 @dataclass
 class SQLMixin:
     """SQLAlchemy SQL Mixin class
 
     :cvar __tablename___: defaults to lowercase of class name
-    :cvar query: querys a record
+    :cvar __archive__: archive table (cold rows), None if not archived
+    :cvar query: querys a record (hot table only)
+    :cvar with_archived: entity over hot and archived rows
     :cvar find: find a record by ID
     :cvar get: get a record by ID (when record is already found)
 
@@ -67,11 +85,30 @@ class SQLMixin:
         return cls.__name__.lower()
 
     __sa_dataclass_metadata_key__ = "sa"
+    __archive__ = None
 
     @classmethod
     def query(cls: Type[_T]) -> "Query[_T]":
         return Settings.session.query(cls)
 
+    @classmethod
+    def with_archived(cls: Type[_T]) -> Type[_T]:
+        """
+        Entity over hot and archived rows (loaded as read-only instances of the class)
+
+        Filter with its own attributes, class attributes refer to the hot table:
+
+            everything = Booking.with_archived()
+            Settings.session.query(everything).filter(everything.date < cutoff)
+        """
+
+        archive: Optional[Table] = getattr(cls, "__archive__", None)
+        if archive is None:
+            raise ValueError(f"{cls.__name__} has no archive table")
+
+        rows = union_all(select(getattr(cls, "__table__")), select(archive)).subquery()
+        return cast(Type[_T], aliased(cls, rows, adapt_on_names=True))
+
     @classmethod
     def find(cls: Type[_T], id: Any) -> Optional[_T]:
         return Settings.session.query(cls).get(id)
@@ -84,6 +121,7 @@ class SQLMixin:
         return record
 
     def save(self):
+        check_cancelled()
         Settings.session.add(self)
         Settings.session.commit()
 
@@ -91,6 +129,7 @@ class SQLMixin:
         Settings.session.refresh(self)
 
     def delete(self):
+        check_cancelled()
         Settings.session.delete(self)
         Settings.session.commit()
 
@@ -107,8 +146,26 @@ class User(SQLMixin):
 @sql_map
 @dataclass
 class Booking(SQLMixin):
+    # Archived ids must never be reused by new bookings
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id: int = Id()
     user_id: Optional[int] = FKey("user.id")
-    date: Optional[dt.date] = Field(Date())
+    date: Optional[dt.date] = Field(Date(), index=True)
     n_pax: Optional[int] = Field(Integer())
     purpose: Optional[str] = Field(String(500))
+
+
+Booking.__archive__ = Archive(Booking.__table__)
+
+
+@sql_map
+@dataclass
+class Timer(SQLMixin):
+    id: int = Id()
+    user_id: Optional[int] = Field(Integer())
+    chat_id: Optional[int] = Field(Integer())
+    service: Optional[str] = Field(String(150))
+    step: Optional[str] = Field(String(150))
+    due: Optional[dt.datetime] = Field(DateTime(), index=True)
+    data: Optional[str] = Field(String(500))
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Optional, Tuple
+
+"""
+Message key
+
+(chat id, message id)
+"""
+MessageKey = Tuple[int, int]
+
+
+def markup_key(markup: Any) -> Optional[str]:
+    """
+    Canonical JSON of a reply markup (markup object / JSON string / None)
+
+    :param markup: reply markup
+    """
+
+    if markup is None:
+        return None
+
+    raw = markup if isinstance(markup, str) else markup.to_json()
+    return json.dumps(json.loads(raw), sort_keys=True)
+
+
+@dataclass
+class MessageState:
+    """
+    Last content sent for a message
+
+    :ivar text: message text
+    :ivar markup: canonical reply markup JSON
+    """
+
+    text: str
+    markup: Optional[str]
+
+
+@dataclass
+class MessageTracker:
+    """
+    Remembers the last text and markup of recently sent / edited messages
+
+    :ivar max_size: number of messages remembered (least recently updated are forgotten)
+    :ivar _states: message states by (chat id, message id)
+    :ivar _lock: lock guarding _states
+    """
+
+    max_size: int = 10000
+    _states: OrderedDict[MessageKey, MessageState] = field(init=False, default_factory=OrderedDict)
+    _lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+
+    def get(self, key: MessageKey) -> Optional[MessageState]:
+        """
+        Last content sent for a message
+
+        :param key: (chat id, message id)
+        """
+
+        with self._lock:
+            return self._states.get(key)
+
+    def update(self, key: MessageKey, state: MessageState) -> None:
+        """
+        Remember the content sent for a message
+
+        :param key: (chat id, message id)
+        :param state: message content
+        """
+
+        with self._lock:
+            self._states[key] = state
+            self._states.move_to_end(key)
+
+            while len(self._states) > self.max_size:
+                self._states.popitem(last=False)
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, Optional, Tuple, Type
+
+import requests
+from requests.adapters import HTTPAdapter
+from telebot import apihelper
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+@dataclass
+class TransportConfig:
+    """
+    Telegram API HTTP transport settings
+
+    :ivar pool_size: keep-alive connections kept per host
+    :ivar pool_connections: number of hosts a connection pool is kept for
+    :ivar connect_timeout: connect timeout (seconds) of calls without an explicit timeout
+    :ivar read_timeout: read timeout (seconds) of calls without an explicit timeout
+    :ivar method_timeouts: (connect, read) timeouts by API method (e.g. "sendDocument")
+    :ivar api_url: API URL template ("{0}" token, "{1}" method), None for Telegram
+    """
+
+    pool_size: int = 8
+    pool_connections: int = 4
+    connect_timeout: float = 5
+    read_timeout: float = apihelper.READ_TIMEOUT
+    method_timeouts: Dict[str, Tuple[float, float]] = field(default_factory=dict)
+    api_url: Optional[str] = None
+
+
+@dataclass
+class TransportMetrics:
+    """
+    Telegram API HTTP transport metrics
+
+    :ivar requests: number of API calls
+    :ivar errors: number of API calls that raised (timeouts, connection errors)
+    :ivar connections: number of connections opened
+    :ivar reused: number of times an already open connection was used
+    """
+
+    requests: int = 0
+    errors: int = 0
+    connections: int = 0
+    reused: int = 0
+
+
+@dataclass
+class Transport:
+    """
+    Shared pooled keep-alive HTTP transport for all Telegram API calls
+
+    By default telebot keeps one session per thread, so every new thread
+    (e.g. a step run under a deadline) opens a new connection.
+
+    :ivar config: transport settings
+    :ivar _session: shared requests session
+    :ivar _adapter: pooled adapter mounted on the session
+    :ivar _metrics: transport metrics (connections counted by the pools)
+    :ivar _lock: lock guarding the metrics
+    """
+
+    config: TransportConfig = field(default_factory=TransportConfig)
+    _session: requests.Session = field(init=False, default_factory=requests.Session)
+    _adapter: HTTPAdapter = field(init=False)
+    _metrics: TransportMetrics = field(init=False, default_factory=TransportMetrics)
+    _lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+
+    def __post_init__(self) -> None:
+        transport = self
+
+        class CountingAdapter(HTTPAdapter):
+            def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+                super().init_poolmanager(*args, **kwargs)
+                self.poolmanager.pool_classes_by_scheme = {
+                    "http": transport._counting(HTTPConnectionPool),
+                    "https": transport._counting(HTTPSConnectionPool),
+                }
+
+        self._adapter = CountingAdapter(
+            pool_connections=self.config.pool_connections,
+            pool_maxsize=self.config.pool_size,
+        )
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+
+    def _counting(self, base: Type[HTTPConnectionPool]) -> Type[HTTPConnectionPool]:
+        """
+        Connection pool class counting opened and reused connections
+
+        :param base: urllib3 connection pool class
+        """
+
+        transport = self
+
+        class CountingPool(base):  # type: ignore
+            def _get_conn(self, timeout: Optional[float] = None) -> Any:
+                conn = super()._get_conn(timeout)
+
+                # A connection without a socket connects on its first request
+                with transport._lock:
+                    if getattr(conn, "sock", None) is None:
+                        transport._metrics.connections += 1
+                    else:
+                        transport._metrics.reused += 1
+
+                return conn
+
+        return CountingPool
+
+    def install(self) -> None:
+        """Route every telebot API call through this transport"""
+
+        apihelper.CUSTOM_REQUEST_SENDER = self.request
+        if self.config.api_url is not None:
+            apihelper.API_URL = self.config.api_url
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        timeout: Optional[Tuple[float, float]] = None,
+        **kwargs: Any,
+    ) -> requests.Response:
+        """
+        Send an API call (telebot CUSTOM_REQUEST_SENDER signature)
+
+        :param method: HTTP method
+        :param url: request URL (ends with the API method)
+        :param timeout: (connect, read) timeouts chosen by telebot
+        """
+
+        api_method = url.rsplit("/", 1)[-1]
+
+        # telebot passes its defaults unless the call (or long polling) chose a timeout
+        default = (apihelper.CONNECT_TIMEOUT, apihelper.READ_TIMEOUT)
+
+        if api_method in self.config.method_timeouts:
+            timeout = self.config.method_timeouts[api_method]
+        elif timeout is None or (tuple(timeout) == default and api_method != "getUpdates"):
+            timeout = (self.config.connect_timeout, self.config.read_timeout)
+
+        with self._lock:
+            self._metrics.requests += 1
+
+        try:
+            return self._session.request(method, url, timeout=timeout, **kwargs)
+        except Exception:
+            with self._lock:
+                self._metrics.errors += 1
+            raise
+
+    @property
+    def metrics(self) -> TransportMetrics:
+        """Current transport metrics"""
+
+        with self._lock:
+            return replace(self._metrics)
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import threading
+from typing import Optional
+
+from models.archive import archive_bookings
+from models.bot import BotClass, Service, StatelessStepResult, service_factory
+from models.info import Info
+from models.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER = dt.timedelta(days=30)
+USAGE = "Usage: /archive [before YYYY-MM-DD, today at the latest]"
+
+
+def parse(data: Optional[str]) -> Optional[dt.date]:
+    """
+    Parses "/archive [before]"
+
+    Upcoming bookings must stay hot (reminders only look at the hot table),
+    so cutoffs after today are rejected.
+
+    :param data: command text
+    :return: cutoff, None if the arguments are invalid
+    """
+
+    args = ("" if data is None else data).split()[1:]
+
+    if len(args) > 1:
+        return None
+
+    try:
+        cutoff = dt.date.fromisoformat(args[0]) if args else dt.date.today() - ARCHIVE_AFTER
+    except ValueError:
+        return None
+
+    return None if cutoff > dt.date.today() else cutoff
+
+
+def setup(bot: BotClass, info: Info, service: Service[None]) -> StatelessStepResult:
+
+    cutoff = parse(info.data)
+
+    if cutoff is None:
+        service.send(USAGE, info.chat_id, markup=None)
+
+        return StatelessStepResult(next_step=None, last_step=True)
+
+    # Archive on its own thread, the inbound workers must not wait for it
+    threading.Thread(target=archive, args=(bot, info.chat_id, cutoff), daemon=True).start()
+    service.send(f"Archiving bookings before {cutoff}, you will be told when done.", info.chat_id, markup=None)
+
+    return StatelessStepResult(next_step=None, last_step=True)
+
+
+def archive(bot: BotClass, chat_id: int, cutoff: dt.date) -> None:
+
+    try:
+        count = archive_bookings(cutoff)
+        bot.send(f"Archived {count} bookings before {cutoff}", chat_id, markup=None)
+
+    except Exception:
+        logger.exception("Archive failed")
+
+        try:
+            bot.send("Archive failed :(", chat_id, markup=None)
+        except Exception:
+            logger.exception("Error while replying to failed archive")
+
+    finally:
+        Settings.close_session()
+
+
+archive_service = service_factory("archive", setup=setup)
@@ -5,22 +5,30 @@ from typing import Any, Tuple, cast
 
 from models.bot import BotClass, Service, StepResult, service_factory
 from models.info import Info
-from models.sql import Booking, User
+from models.scheduler import Scheduler
+from models.sql import Booking
 from telegram_bot_calendar import WMonthTelegramCalendar as cal
 
+UNFINISHED_AFTER = dt.timedelta(minutes=10)
+REMIND_BEFORE = dt.timedelta(days=1)
+REMIND_AT = dt.time(hour=9)
+
 
 def setup(bot: BotClass, info: Info, service: Service[Booking]) -> StepResult[Booking]:
 
-    # Setup Data
+    # Setup Data (saved once a date is selected)
     booking = Booking()
-    user = User.get(info.user_id)
-    user.bookings.append(booking)
+    booking.user_id = info.user_id
     service.data = booking
 
     # Build calendar markup
     calendar, _ = cast(Tuple[Any, ...], cal(min_date=dt.date.today()).build())
     service.send("Select booking datee:", info.chat_id, calendar, expire=True)
 
+    # Remind the user if the booking is not finished
+    Scheduler.cancel(info.user_id, "booking", step="unfinished")
+    Scheduler.schedule(dt.datetime.now() + UNFINISHED_AFTER, info.user_id, info.chat_id, "booking", step="unfinished")
+
     return StepResult[Booking](next_step="set_date", last_step=False)
 
 
@@ -42,14 +50,20 @@ def set_date(bot: BotClass, info: Info, service: Service[Booking]) -> StepResult
             bot.edit(f"Selected {result}", info.chat_id, info.message_id)
             service.clear_expire()
             service.data.date = result
+            service.data.save()
+
+            # Replace the unfinished reminder with a reminder before the booking
+            Scheduler.cancel(info.user_id, "booking", step="unfinished")
+            remind_at = dt.datetime.combine(result, REMIND_AT) - REMIND_BEFORE
+
+            # Too late to remind (e.g. booked for today), it would fire right away
+            if remind_at > dt.datetime.now():
+                Scheduler.schedule(remind_at, info.user_id, info.chat_id, "reminder", data=str(service.data.id))
 
             return StepResult[Booking](next_step=None, last_step=True)
 
         else:
-            # Cancelled
-            bot.edit("Cancelled", info.chat_id, info.message_id)
-
-            # Resend calendar
+            # Cancelled: reset the calendar in place
             service.resend(service.last_sent[0], expire=True)
 
             return StepResult[Booking](next_step=None, last_step=False)
@@ -62,4 +76,28 @@ def set_date(bot: BotClass, info: Info, service: Service[Booking]) -> StepResult
         return StepResult[Booking](next_step=None, last_step=False)
 
 
-booking_service = service_factory("booking", setup=setup, steps={"set_date": set_date})
+def unfinished(bot: BotClass, info: Info, service: Service[Booking]) -> StepResult[Booking]:
+
+    # Plain message, not part of the booking conversation
+    bot.send("You have not finished your booking, please select a date above.", info.chat_id, markup=None)
+
+    return StepResult[Booking](next_step=None, last_step=False, expire_all=False)
+
+
+def remind(bot: BotClass, info: Info, service: Service[Booking]) -> StepResult[Booking]:
+
+    booking = None if info.data is None else Booking.find(int(info.data))
+
+    if booking is not None and booking.date is not None:
+        bot.send(f"Reminder: you have a booking on {booking.date}", info.chat_id, markup=None)
+
+    return StepResult[Booking](next_step=None, last_step=True)
+
+
+booking_service = service_factory(
+    "booking",
+    setup=setup,
+    steps={"set_date": set_date, "unfinished": unfinished},
+    timeout=20,
+)
+reminder_service = service_factory("reminder", setup=remind, timeout=20)
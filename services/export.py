@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import os
+import tempfile
+import threading
+from typing import Optional, Tuple
+
+from models.bot import BotClass, Service, StatelessStepResult, service_factory
+from models.export import FORMATS, export_bookings
+from models.info import Info
+
+logger = logging.getLogger(__name__)
+
+USAGE = "Usage: /export [csv|json] [from YYYY-MM-DD] [to YYYY-MM-DD]"
+
+
+def parse(data: Optional[str]) -> Optional[Tuple[str, Optional[dt.date], Optional[dt.date]]]:
+    """
+    Parses "/export [format] [from] [to]"
+
+    :param data: command text
+    :return: (format, from, to), None if the arguments are invalid
+    """
+
+    args = ("" if data is None else data).split()[1:]
+    fmt = args[0] if args else "csv"
+
+    if fmt not in FORMATS or len(args) > 3:
+        return None
+
+    try:
+        start = dt.date.fromisoformat(args[1]) if len(args) > 1 else None
+        end = dt.date.fromisoformat(args[2]) if len(args) > 2 else None
+    except ValueError:
+        return None
+
+    return fmt, start, end
+
+
+def setup(bot: BotClass, info: Info, service: Service[None]) -> StatelessStepResult:
+
+    parsed = parse(info.data)
+
+    if parsed is None:
+        service.send(USAGE, info.chat_id, markup=None)
+
+        return StatelessStepResult(next_step=None, last_step=True)
+
+    fmt, start, end = parsed
+
+    # Export on its own thread, the inbound workers must not wait for it
+    threading.Thread(target=export, args=(bot, info.chat_id, fmt, start, end), daemon=True).start()
+    service.send("Preparing export, it will be sent when ready.", info.chat_id, markup=None)
+
+    return StatelessStepResult(next_step=None, last_step=True)
+
+
+def export(bot: BotClass, chat_id: int, fmt: str, start: Optional[dt.date], end: Optional[dt.date]) -> None:
+
+    try:
+        # Stream into a temporary file, then upload it as a document
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, f"bookings.{fmt}")
+
+            with open(path, "w", newline="") as fp:
+                count = export_bookings(fp, fmt, start=start, end=end, include_archived=True)
+
+            with open(path, "rb") as fp:
+                bot.send_document(fp, chat_id, caption=f"{count} bookings")
+
+    except Exception:
+        logger.exception("Export failed")
+
+        try:
+            bot.send("Export failed :(", chat_id, markup=None)
+        except Exception:
+            logger.exception("Error while replying to failed export")
+
+
+export_service = service_factory("export", setup=setup)
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import datetime as dt
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from models.scheduler import Scheduler
+from models.settings import Settings
+from models.sql import Booking, User
+
+
+@pytest.fixture
+def db(tmp_path: Path) -> Iterator[None]:
+    """Fresh SQLite database (no Telegram calls are made)"""
+
+    Settings.start("1:test", str(tmp_path / "db.db"))
+    yield
+    Settings.close_session()
+
+
+@pytest.fixture
+def scheduler() -> Iterator[None]:
+    """Empty scheduler state"""
+
+    Scheduler._heap = []
+    Scheduler._loaded = set()
+    Scheduler._loaded_until = dt.datetime.min
+    Scheduler._deliver = None
+    yield
+    Scheduler._deliver = None
+
+
+def make_booking(user_id: int, date: dt.date, n_pax: int = 1) -> Booking:
+    booking = Booking()
+    booking.user_id = user_id
+    booking.date = date
+    booking.n_pax = n_pax
+    booking.purpose = "meeting"
+    booking.save()
+    return booking
+
+
+def make_user(id_: int, username: str) -> User:
+    user = User()
+    user.id = id_
+    user.username = username
+    user.email = f"{username}@e.ntu.edu.sg"
+    user.save()
+    return user
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import datetime as dt
+from typing import Any, List
+
+import pytest
+
+from models.archive import archive_bookings
+from models.settings import Settings
+from models.sql import Booking
+from services.archive import ARCHIVE_AFTER, archive, parse
+from tests.conftest import make_booking
+
+
+class FakeBot:
+    def __init__(self) -> None:
+        self.sent: List[str] = []
+
+    def send(self, text: str, chat_id: int, **kwargs: Any) -> None:
+        self.sent.append(text)
+
+
+def test_archive_moves_past_bookings_in_batches(db):
+    for days in range(7):
+        make_booking(1, dt.date(2020, 1, 1) + dt.timedelta(days=days))
+    upcoming = make_booking(1, dt.date.today())
+
+    assert archive_bookings(dt.date(2020, 1, 6), batch_size=2) == 5
+
+    assert [booking.id for booking in Booking.query().order_by(Booking.id)] == [6, 7, upcoming.id]
+    assert Settings.session.query(Booking.with_archived()).count() == 8
+
+
+def test_archived_entity_can_be_filtered(db):
+    old = make_booking(1, dt.date(2020, 1, 1))
+    make_booking(1, dt.date(2020, 6, 1))
+    archive_bookings(dt.date(2020, 3, 1))
+
+    everything = Booking.with_archived()
+    found = Settings.session.query(everything).filter(everything.date < dt.date(2020, 3, 1)).all()
+
+    assert [(booking.id, booking.date) for booking in found] == [(old.id, old.date)]
+
+
+def test_archive_rejects_future_cutoff(db):
+    make_booking(1, dt.date.today() + dt.timedelta(days=1))
+
+    with pytest.raises(ValueError):
+        archive_bookings(dt.date.today() + dt.timedelta(days=1))
+
+    assert Booking.query().count() == 1
+
+
+def test_parse_archive_arguments():
+    today = dt.date.today()
+
+    assert parse("/archive") == today - ARCHIVE_AFTER
+    assert parse("/archive 2020-01-01") == dt.date(2020, 1, 1)
+    assert parse(f"/archive {today}") == today
+
+
+@pytest.mark.parametrize("data", ["/archive soon", "/archive 2020-01-01 2020-02-01", f"/archive {dt.date.max}"])
+def test_parse_invalid_archive_arguments(data):
+    assert parse(data) is None
+
+
+def test_archive_reports_count(db):
+    make_booking(1, dt.date(2020, 1, 1))
+    make_booking(1, dt.date(2020, 6, 1))
+    bot = FakeBot()
+
+    archive(bot, 1, dt.date(2020, 3, 1))  # type: ignore
+
+    assert bot.sent == ["Archived 1 bookings before 2020-03-01"]
+    assert Booking.query().count() == 1
+
+
+def test_archive_reports_failure(db):
+    bot = FakeBot()
+
+    archive(bot, 1, dt.date.today() + dt.timedelta(days=1))  # type: ignore
+
+    assert bot.sent == ["Archive failed :("]
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import threading
+from queue import Queue
+from typing import Any, List, Tuple
+
+import pytest
+from telebot.types import CallbackQuery, Message
+
+from models.bot import Bot
+from models.inbound import PRIORITY_CALLBACK, PRIORITY_COMMAND, PRIORITY_CONVERSATION, InboundQueue, LoadPolicy
+
+
+class FakeTeleBot:
+    def __init__(self) -> None:
+        self.calls: List[Tuple[str, Any]] = []
+        self.called = threading.Event()
+
+    def send_message(self, **kwargs: Any) -> Message:
+        self.calls.append(("message", kwargs["chat_id"]))
+        self.called.set()
+        return message(kwargs["chat_id"], kwargs["text"])
+
+    def answer_callback_query(self, callback_query_id: str, text: str) -> None:
+        self.calls.append(("answer", callback_query_id))
+        self.called.set()
+
+
+def message(user_id: int, text: str) -> Message:
+    user = {"id": user_id, "is_bot": False, "first_name": "user"}
+    return Message.de_json(
+        {"message_id": 1, "date": 0, "chat": {"id": user_id, "type": "private"}, "from": user, "text": text}
+    )
+
+
+def callback(user_id: int) -> CallbackQuery:
+    user = {"id": user_id, "is_bot": False, "first_name": "user"}
+    sent = {"message_id": 1, "date": 1, "chat": {"id": user_id, "type": "private"}, "text": "Pick"}
+    return CallbackQuery.de_json(
+        {"id": f"q{user_id}", "from": user, "chat_instance": "c", "data": "a", "message": sent}
+    )
+
+
+@pytest.fixture
+def bot():
+    fake = FakeTeleBot()
+    Bot.bot = fake  # type: ignore
+    Bot.active_services = {}
+    Bot._busy_replied = {}
+    yield fake
+    Bot.active_services = {}
+
+
+def use_policy(policy: LoadPolicy) -> None:
+    Bot.queue = InboundQueue(policy)
+    Bot.busy = Queue(policy.busy_backlog)
+
+
+def test_enqueue_priorities(bot):
+    use_policy(LoadPolicy())
+    Bot.active_services[2] = object()  # type: ignore
+
+    Bot.enqueue(message(1, "/book"))
+    Bot.enqueue(message(2, "tomorrow"))
+    Bot.enqueue(message(2, "/book"))
+    Bot.enqueue(callback(3))
+
+    queued = [(priority, user_id) for priority, _, user_id, _ in sorted(Bot.queue._heap)]
+    assert queued == [
+        (PRIORITY_CALLBACK, 3),
+        (PRIORITY_CONVERSATION, 2),
+        (PRIORITY_COMMAND, 1),
+        (PRIORITY_COMMAND, 2),
+    ]
+
+
+def test_shed_queues_one_busy_reply_per_user(bot):
+    use_policy(LoadPolicy(max_size=1, busy_interval=60))
+
+    Bot.enqueue(message(1, "/book"))
+    for _ in range(3):
+        Bot.enqueue(message(2, "/book"))
+    Bot.enqueue(callback(3))
+
+    # Nothing is sent on intake
+    assert bot.calls == []
+
+    replies = [Bot.busy.get_nowait() for _ in range(Bot.busy.qsize())]
+    assert [(text, type(data).__name__, data.from_user.id) for text, data in replies] == [
+        ("Busy, try again later", "Message", 2),
+        ("Busy, try again later", "Message", 1),
+    ]
+
+
+def test_shed_drops_busy_replies_beyond_backlog(bot):
+    use_policy(LoadPolicy(max_size=1, busy_backlog=2))
+
+    Bot.enqueue(callback(1))
+    for user_id in range(2, 6):
+        Bot.enqueue(message(user_id, "/book"))
+
+    assert Bot.busy.qsize() == 2
+    assert Bot.queue.metrics.shed["full"] == 4
+
+
+def test_flooding_and_silent_sheds_get_no_reply(bot):
+    use_policy(LoadPolicy(max_size=1, flood_burst=0, flood_rate=0))
+    Bot.queue.put(9, PRIORITY_CALLBACK, callback(9), limit=False)
+    Bot.enqueue(message(1, "/book"))
+
+    assert Bot.queue.metrics.shed["flood"] == 1
+
+    use_policy(LoadPolicy(max_size=1, busy_text=None))
+    Bot.enqueue(message(9, "/book"))
+    Bot.enqueue(message(2, "/book"))
+
+    assert Bot.queue.metrics.shed["full"] == 1
+    assert Bot.busy.qsize() == 0
+
+
+def test_busy_worker_sends_replies(bot):
+    use_policy(LoadPolicy(max_size=1))
+    Bot.enqueue(callback(9))
+    Bot.enqueue(callback(1))
+
+    threading.Thread(target=Bot.busy_worker, daemon=True).start()
+    bot.called.wait(1)
+
+    assert bot.calls == [("answer", "q1")]
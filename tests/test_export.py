@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import csv
+import datetime as dt
+import io
+import json
+
+import pytest
+
+from models.archive import archive_bookings
+from models.export import COLUMNS, export_bookings
+from services.export import parse
+from tests.conftest import make_booking, make_user
+
+
+@pytest.fixture
+def bookings(db):
+    make_user(1, "alice")
+    make_user(2, "bob")
+    make_booking(1, dt.date(2020, 1, 1), n_pax=2)
+    make_booking(2, dt.date(2020, 6, 1), n_pax=3)
+    make_booking(1, dt.date(2021, 1, 1), n_pax=4)
+
+
+def test_csv_export(bookings):
+    fp = io.StringIO()
+
+    assert export_bookings(fp, "csv", chunk_size=2) == 3
+
+    rows = list(csv.reader(io.StringIO(fp.getvalue())))
+    assert rows[0] == list(COLUMNS)
+    assert rows[1] == ["1", "2020-01-01", "2", "meeting", "1", "alice", "alice@e.ntu.edu.sg"]
+    assert [row[1] for row in rows[1:]] == ["2020-01-01", "2020-06-01", "2021-01-01"]
+
+
+def test_json_export_with_date_range(bookings):
+    fp = io.StringIO()
+
+    assert export_bookings(fp, "json", start=dt.date(2020, 2, 1), end=dt.date(2021, 1, 1)) == 2
+
+    rows = json.loads(fp.getvalue())
+    assert [(row["date"], row["username"]) for row in rows] == [("2020-06-01", "bob"), ("2021-01-01", "alice")]
+
+
+def test_empty_json_export(db):
+    fp = io.StringIO()
+
+    assert export_bookings(fp, "json") == 0
+    assert json.loads(fp.getvalue()) == []
+
+
+def test_export_includes_archived_on_request(bookings):
+    archive_bookings(dt.date(2020, 12, 31))
+
+    assert export_bookings(io.StringIO()) == 1
+    assert export_bookings(io.StringIO(), include_archived=True) == 3
+
+
+def test_unknown_format(db):
+    with pytest.raises(ValueError):
+        export_bookings(io.StringIO(), "xml")
+
+
+def test_parse_export_arguments():
+    assert parse("/export") == ("csv", None, None)
+    assert parse("/export json 2020-01-01") == ("json", dt.date(2020, 1, 1), None)
+    assert parse("/export csv 2020-01-01 2020-12-31") == ("csv", dt.date(2020, 1, 1), dt.date(2020, 12, 31))
+
+
+@pytest.mark.parametrize(
+    "data",
+    ["/export xml", "/export csv 2020-13-01", "/export json 2020-01-01 soon", "/export csv 2020-01-01 2020-12-31 x"],
+)
+def test_parse_invalid_export_arguments(data):
+    assert parse(data) is None
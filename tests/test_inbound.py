@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import time
+
+from models.inbound import (
+    PRIORITY_CALLBACK,
+    PRIORITY_COMMAND,
+    PRIORITY_CONVERSATION,
+    InboundQueue,
+    LoadPolicy,
+)
+
+
+def drain(queue: InboundQueue[str]) -> list:
+    items = []
+    while queue.metrics.depth:
+        user_id, item = queue.get()
+        queue.done(user_id)
+        items.append(item)
+    return items
+
+
+def test_priority_order():
+    queue: InboundQueue[str] = InboundQueue(LoadPolicy())
+    queue.put(1, PRIORITY_COMMAND, "command")
+    queue.put(2, PRIORITY_CONVERSATION, "conversation")
+    queue.put(3, PRIORITY_CALLBACK, "callback")
+    queue.put(4, PRIORITY_COMMAND, "command 2")
+
+    assert drain(queue) == ["callback", "conversation", "command", "command 2"]
+
+
+def test_full_queue_sheds_newest_worst_event():
+    queue: InboundQueue[str] = InboundQueue(LoadPolicy(max_size=2))
+    assert queue.put(1, PRIORITY_COMMAND, "a") is None
+    assert queue.put(2, PRIORITY_COMMAND, "b") is None
+
+    # A better event evicts the newest command
+    assert queue.put(3, PRIORITY_CALLBACK, "cb") == ("full", "b")
+
+    # An event no better than the worst queued one is shed itself
+    assert queue.put(4, PRIORITY_COMMAND, "c") == ("full", "c")
+
+    assert queue.metrics.shed["full"] == 2
+    assert drain(queue) == ["cb", "a"]
+
+
+def test_flooding_user_is_shed_first():
+    queue: InboundQueue[str] = InboundQueue(LoadPolicy(max_size=3, flood_burst=2, flood_rate=0))
+    queue.put(1, PRIORITY_CALLBACK, "spam 1")
+    queue.put(1, PRIORITY_CALLBACK, "spam 2")
+    queue.put(1, PRIORITY_CALLBACK, "spam 3")
+
+    # The spammer's third event is demoted below a new command and shed first
+    assert queue.put(2, PRIORITY_COMMAND, "command") == ("flood", "spam 3")
+    assert queue.metrics.shed["flood"] == 1
+    assert drain(queue) == ["spam 1", "spam 2", "command"]
+
+
+def test_token_bucket_refills():
+    queue: InboundQueue[str] = InboundQueue(LoadPolicy(flood_burst=1, flood_rate=50))
+
+    assert not queue._flooding(1)
+    assert queue._flooding(1)
+
+    time.sleep(0.05)
+    assert not queue._flooding(1)
+
+
+def test_unlimited_events_skip_flood_limit():
+    queue: InboundQueue[str] = InboundQueue(LoadPolicy(max_size=1, flood_burst=0, flood_rate=0))
+
+    assert queue.put(1, PRIORITY_CONVERSATION, "timer", limit=False) is None
+    assert queue.put(2, PRIORITY_COMMAND, "command") == ("flood", "command")
+
+
+def test_idle_buckets_are_pruned():
+    queue: InboundQueue[str] = InboundQueue(LoadPolicy(flood_burst=2, flood_rate=1000))
+    for user_id in range(10):
+        queue._flooding(user_id)
+
+    time.sleep(0.01)
+    queue._prune()
+
+    assert queue._buckets == {}
+
+
+def test_events_of_busy_user_are_held_back():
+    queue: InboundQueue[str] = InboundQueue(LoadPolicy())
+    queue.put(1, PRIORITY_CALLBACK, "first")
+    queue.put(1, PRIORITY_CALLBACK, "second")
+    queue.put(2, PRIORITY_COMMAND, "other")
+
+    assert queue.get() == (1, "first")
+
+    # User 1 is still being handled, so the next worker gets user 2
+    assert queue.get() == (2, "other")
+
+    queue.done(1)
+    assert queue.get() == (1, "second")
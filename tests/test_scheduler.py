@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import datetime as dt
+import threading
+from typing import Any, List
+
+import pytest
+from sqlalchemy import event
+
+from models.bot import Bot
+from models.info import Info
+from models.scheduler import Scheduler
+from models.settings import Settings
+from models.sql import Timer
+
+
+def deliveries() -> List[Info]:
+    delivered: List[Info] = []
+    Scheduler._deliver = delivered.append
+    return delivered
+
+
+def test_load_only_near_term_window(db, scheduler):
+    now = dt.datetime.now()
+    soon = Scheduler.schedule(now + dt.timedelta(minutes=1), 1, 10, "booking", step="unfinished")
+    Scheduler.schedule(now + dt.timedelta(days=1), 1, 10, "reminder", data="5")
+
+    Scheduler._load(now + dt.timedelta(minutes=10))
+
+    assert [id_ for _, id_ in Scheduler._heap] == [soon]
+    assert Timer.query().count() == 2
+
+
+def test_schedule_within_loaded_window_is_pushed_once(db, scheduler):
+    now = dt.datetime.now()
+    Scheduler._load(now + dt.timedelta(minutes=10))
+
+    id_ = Scheduler.schedule(now + dt.timedelta(minutes=1), 1, 10, "booking")
+    Scheduler._load(now + dt.timedelta(minutes=20))
+
+    assert Scheduler._heap == [(now + dt.timedelta(minutes=1), id_)]
+
+
+def test_fire_delivers_and_keeps_timer_until_done(db, scheduler):
+    delivered = deliveries()
+    due = dt.datetime.now() - dt.timedelta(seconds=1)
+    id_ = Scheduler.schedule(due, 1, 10, "booking", step="unfinished", data="x")
+
+    Scheduler._fire(id_)
+
+    assert len(delivered) == 1
+    info = delivered[0]
+    assert (info.id, info.user_id, info.chat_id, info.kind) == (id_, 1, 10, "timer")
+    assert (info.timer_service, info.timer_step, info.data, info.sent) == ("booking", "unfinished", "x", due)
+    assert Scheduler.pending(id_)
+
+    Scheduler.done(id_)
+    assert not Scheduler.pending(id_)
+
+
+def test_cancelled_timer_is_not_delivered(db, scheduler):
+    delivered = deliveries()
+    now = dt.datetime.now()
+    unfinished = Scheduler.schedule(now, 1, 10, "booking", step="unfinished")
+    other = Scheduler.schedule(now, 1, 10, "booking", step="other")
+    reminder = Scheduler.schedule(now, 1, 10, "reminder")
+
+    Scheduler.cancel(1, "booking", step="unfinished")
+    for id_ in (unfinished, other, reminder):
+        Scheduler._fire(id_)
+
+    assert [info.id for info in delivered] == [other, reminder]
+
+    Scheduler.cancel(1, "booking")
+    assert not Scheduler.pending(other)
+    assert Scheduler.pending(reminder)
+
+
+def test_retry_pushes_timer_back(db, scheduler):
+    id_ = Scheduler.schedule(dt.datetime.now() + dt.timedelta(days=1), 1, 10, "reminder")
+
+    Scheduler.retry(id_)
+    Scheduler.retry(id_)
+
+    assert [entry for _, entry in Scheduler._heap] == [id_]
+
+
+def test_load_queries_without_holding_the_lock(db, scheduler):
+    now = dt.datetime.now()
+    scheduled: List[int] = []
+
+    # Another thread schedules a timer due within the window while the load query runs
+    def schedule_meanwhile(*args: Any) -> None:
+        if not scheduled:
+            scheduled.append(0)
+            thread = threading.Thread(
+                target=lambda: scheduled.append(Scheduler.schedule(now + dt.timedelta(minutes=1), 1, 10, "booking"))
+            )
+            thread.start()
+            thread.join(1)
+
+    event.listen(Settings.engine, "before_cursor_execute", schedule_meanwhile)
+    try:
+        Scheduler._load(now + dt.timedelta(minutes=10))
+    finally:
+        event.remove(Settings.engine, "before_cursor_execute", schedule_meanwhile)
+
+    assert len(scheduled) == 2
+    assert Scheduler._heap == [(now + dt.timedelta(minutes=1), scheduled[1])]
+
+
+def test_failed_load_is_repeated(db, scheduler):
+    def fail(*args: Any) -> None:
+        raise RuntimeError("database is locked")
+
+    event.listen(Settings.engine, "before_cursor_execute", fail)
+    try:
+        with pytest.raises(RuntimeError):
+            Scheduler._load(dt.datetime.now() + dt.timedelta(minutes=10))
+    finally:
+        event.remove(Settings.engine, "before_cursor_execute", fail)
+
+    assert Scheduler._loaded_until == dt.datetime.min
+
+
+def test_timer_is_done_when_dispatcher_fails(db, scheduler, monkeypatch):
+    def dispatcher(info: Info, service: Any) -> None:
+        raise RuntimeError("dispatcher failed")
+
+    monkeypatch.setattr(Bot, "active_services", {})
+    monkeypatch.setattr(Bot, "dispatcher", dispatcher)
+
+    id_ = Scheduler.schedule(dt.datetime.now(), 1, 10, "reminder")
+    info = Info(
+        id=id_,
+        chat_id=10,
+        message_id=0,
+        user_id=1,
+        username=None,
+        kind="timer",
+        data=None,
+        sent=dt.datetime.now(),
+        timer_service="reminder",
+    )
+
+    Bot.handler(info)
+
+    assert not Scheduler.pending(id_)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import datetime as dt
+import threading
+from typing import Any, List
+
+from models.bot import Bot, Service, StepResult, service_factory
+from models.cancel import step_state
+from models.inbound import PRIORITY_COMMAND, InboundQueue, LoadPolicy
+from models.info import Info
+from models.sql import Booking
+from models.tracker import MessageTracker
+
+
+class FakeTeleBot:
+    def __init__(self) -> None:
+        self.sent: List[str] = []
+        self.release = threading.Event()
+
+    def send_message(self, **kwargs: Any) -> None:
+        self.sent.append(kwargs["text"])
+
+    def edit_message_text(self, **kwargs: Any) -> None:
+        # Telegram is stuck until released
+        self.release.wait()
+
+
+def info() -> Info:
+    return Info(id=1, chat_id=1, message_id=1, user_id=1, username=None, kind="text", data="hi", sent=dt.datetime.now())
+
+
+def test_abandoned_step_cannot_save(db):
+    bot = FakeTeleBot()
+    Bot.bot = bot  # type: ignore
+    release = threading.Event()
+    finished = threading.Event()
+
+    def stuck(bot: Any, info: Info, service: Service[Booking]) -> StepResult[Booking]:
+        try:
+            release.wait()
+            booking = Booking()
+            booking.user_id = info.user_id
+            booking.save()
+            return StepResult[Booking](next_step="next", last_step=False)
+        finally:
+            finished.set()
+
+    service = service_factory("stuck", setup=stuck, timeout=0.05)()
+    result = service.handle(info())
+
+    assert result == StepResult[Booking](next_step=None, last_step=False, expire_all=False)
+    assert bot.sent == [service.timeout_text]
+    assert Service.timeout_counts["stuck.setup"] == 1
+
+    release.set()
+    finished.wait(1)
+
+    assert Booking.query().count() == 0
+
+
+def test_abandoned_step_cannot_change_service_after_io(db):
+    bot = FakeTeleBot()
+    Bot.bot = bot  # type: ignore
+    Bot.messages = MessageTracker()
+    finished = threading.Event()
+
+    def stuck(bot: Any, info: Info, service: Service[str]) -> StepResult[str]:
+        try:
+            bot.edit("Selected", info.chat_id, info.message_id)
+            service.clear_expire()
+            service.data = "after"
+            return StepResult[str](next_step="next", last_step=False)
+        finally:
+            finished.set()
+
+    service = service_factory("stuck", setup=stuck, timeout=0.05)()
+    service.data = "before"
+    expiring = object()
+    service.last_expire = [expiring]  # type: ignore
+
+    step_state.abandoned = []
+    try:
+        service.handle(info())
+        abandoned = step_state.abandoned
+    finally:
+        step_state.abandoned = None
+
+    assert len(abandoned) == 1
+
+    bot.release.set()
+    finished.wait(1)
+
+    assert service.data == "before"
+    assert service.last_expire == [expiring]
+
+
+def test_user_stays_busy_until_abandoned_step_ends():
+    Bot.queue = InboundQueue(LoadPolicy())
+    Bot.queue.put(1, PRIORITY_COMMAND, "first")
+    Bot.queue.put(1, PRIORITY_COMMAND, "second")
+    Bot.queue.put(2, PRIORITY_COMMAND, "other")
+
+    end = threading.Event()
+    step = threading.Thread(target=end.wait, daemon=True)
+    step.start()
+
+    assert Bot.queue.get() == (1, "first")
+    Bot.release(1, [step])
+
+    # Other users are served meanwhile
+    assert Bot.queue.get() == (2, "other")
+    Bot.release(2, [])
+    assert 1 in Bot.queue._busy
+
+    end.set()
+    step.join(1)
+
+    assert Bot.queue.get() == (1, "second")
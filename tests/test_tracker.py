@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from typing import Any, List, Tuple
+
+import pytest
+from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup, Message, ReplyKeyboardMarkup
+
+from models.bot import Bot, Service, StepResult, service_factory
+from models.tracker import MessageState, MessageTracker, markup_key
+
+CALENDAR = '{"inline_keyboard": [[{"text": "1", "callback_data": "a"}]]}'
+
+
+class FakeTeleBot:
+    def __init__(self) -> None:
+        self.calls: List[Tuple[str, Any]] = []
+
+    def edit_message_text(self, **kwargs: Any) -> None:
+        self.calls.append(("text", kwargs["text"]))
+
+    def edit_message_reply_markup(self, **kwargs: Any) -> None:
+        self.calls.append(("markup", kwargs["reply_markup"]))
+
+    def send_message(self, **kwargs: Any) -> Message:
+        self.calls.append(("send", kwargs["text"]))
+        return message(2, kwargs["text"], None)
+
+
+def message(message_id: int, text: str, markup: Any) -> Message:
+    data = {"message_id": message_id, "date": 1, "chat": {"id": 1, "type": "private"}, "text": text}
+    if markup is not None:
+        data["reply_markup"] = markup
+    return Message.de_json(data)
+
+
+def service() -> Service[None]:
+    return service_factory("calendar", setup=lambda bot, info, service: StepResult[None](None, True))()
+
+
+@pytest.fixture
+def fake_bot():
+    bot = FakeTeleBot()
+    Bot.bot = bot  # type: ignore
+    Bot.messages = MessageTracker()
+    yield bot
+
+
+def test_markup_key_is_canonical():
+    markup = InlineKeyboardMarkup()
+    markup.add(InlineKeyboardButton("1", callback_data="a"))
+
+    assert markup_key(None) is None
+    assert markup_key(markup) == markup_key(CALENDAR)
+    assert markup_key('{"inline_keyboard":[[{"callback_data":"a","text":"1"}]]}') == markup_key(CALENDAR)
+
+
+def test_tracker_forgets_least_recently_updated():
+    tracker = MessageTracker(max_size=2)
+    tracker.update((1, 1), MessageState("a", None))
+    tracker.update((1, 2), MessageState("b", None))
+    tracker.update((1, 1), MessageState("c", None))
+    tracker.update((1, 3), MessageState("d", None))
+
+    assert tracker.get((1, 2)) is None
+    assert tracker.get((1, 1)) == MessageState("c", None)
+    assert tracker.get((1, 3)) == MessageState("d", None)
+
+
+def test_edit_skips_unchanged_and_sends_markup_only(fake_bot):
+    Bot.messages.update((1, 1), MessageState("Pick", markup_key(CALENDAR)))
+
+    Bot.edit("Pick", 1, 1, markup=CALENDAR)
+    assert fake_bot.calls == []
+
+    other = '{"inline_keyboard": [[{"text": "2", "callback_data": "b"}]]}'
+    Bot.edit("Pick", 1, 1, markup=other)
+    Bot.edit("Pick", 1, 1, markup=other)
+    assert fake_bot.calls == [("markup", other)]
+
+    Bot.edit("Done", 1, 1)
+    assert fake_bot.calls[-1] == ("text", "Done")
+    assert Bot.messages.get((1, 1)) == MessageState("Done", None)
+
+
+def test_edit_untracked_message_edits_text(fake_bot):
+    Bot.edit("Pick", 1, 2, markup=CALENDAR)
+    Bot.edit("Pick", 1, 2, markup=CALENDAR)
+
+    assert fake_bot.calls == [("text", "Pick")]
+
+
+def test_resend_edits_tracked_message_in_place(fake_bot):
+    calendar = message(1, "Pick", {"inline_keyboard": [[{"text": "1", "callback_data": "a"}]]})
+    Bot.messages.update((1, 1), MessageState("Selected", None))
+    resending = service()
+    resending.last_expire = [calendar]
+
+    assert resending.resend(calendar, expire=True) is calendar
+
+    assert fake_bot.calls == [("text", "Pick")]
+    assert Bot.messages.get((1, 1)) == MessageState("Pick", markup_key(calendar.reply_markup))
+    assert resending.last_expire == []
+    assert resending._current_sent == [calendar]
+    assert resending._current_expire == [calendar]
+
+    # Resending an unchanged message calls nothing
+    resending.resend(calendar, expire=False)
+    assert fake_bot.calls == [("text", "Pick")]
+
+
+def test_resend_sends_untracked_message(fake_bot):
+    calendar = message(1, "Pick", {"inline_keyboard": [[{"text": "1", "callback_data": "a"}]]})
+    resending = service()
+
+    sent = resending.resend(calendar, expire=False)
+
+    assert fake_bot.calls == [("send", "Pick")]
+    assert sent.message_id == 2
+    assert resending._current_sent == [sent]
+    assert resending._current_expire == []
+
+
+def test_resend_sends_reply_keyboard_message(fake_bot):
+    # Sent messages only carry inline keyboards, a reply keyboard comes from the step itself
+    keyboard = message(1, "Pick", None)
+    keyboard.reply_markup = ReplyKeyboardMarkup()
+    Bot.messages.update((1, 1), MessageState("Pick", None))
+
+    service().resend(keyboard, expire=False)
+
+    assert fake_bot.calls == [("send", "Pick")]
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import threading
+from http.server import ThreadingHTTPServer
+from typing import Any, Iterator, List, Optional, Tuple
+
+import pytest
+import requests
+from telebot import TeleBot, apihelper
+
+import bench.transport
+from bench.transport import FakeTelegram
+from models.transport import Transport, TransportConfig, TransportMetrics
+
+DEFAULT = (apihelper.CONNECT_TIMEOUT, apihelper.READ_TIMEOUT)
+
+
+@pytest.fixture
+def server(monkeypatch) -> Iterator[str]:
+    """Fake Telegram API URL template"""
+
+    monkeypatch.setattr(bench.transport, "HANDSHAKE", 0)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FakeTelegram)
+    threading.Thread(target=httpd.serve_forever, args=(0.01,), daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}/bot{{0}}/{{1}}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def recording(transport: Transport) -> List[Optional[Tuple[float, float]]]:
+    """Timeouts the transport sends its requests with"""
+
+    timeouts: List[Optional[Tuple[float, float]]] = []
+    send = transport._session.request
+
+    def request(method: str, url: str, timeout: Any = None, **kwargs: Any) -> requests.Response:
+        timeouts.append(timeout)
+        return send(method, url, timeout=timeout, **kwargs)
+
+    transport._session.request = request  # type: ignore
+    return timeouts
+
+
+def test_timeout_choice(server):
+    transport = Transport(TransportConfig(connect_timeout=1, read_timeout=2, method_timeouts={"sendDocument": (3, 4)}))
+    timeouts = recording(transport)
+
+    # No timeout or telebot's defaults: the transport's timeouts
+    transport.request("post", server.format("1:t", "sendMessage"))
+    transport.request("post", server.format("1:t", "sendMessage"), timeout=DEFAULT)
+
+    # Explicit timeouts and long polling keep their own
+    transport.request("post", server.format("1:t", "sendMessage"), timeout=(9, 9))
+    transport.request("post", server.format("1:t", "getUpdates"), timeout=DEFAULT)
+
+    # Per-method timeouts always win
+    transport.request("post", server.format("1:t", "sendDocument"), timeout=(9, 9))
+
+    assert timeouts == [(1, 2), (1, 2), (9, 9), DEFAULT, (3, 4)]
+
+
+def test_metrics_count_reused_connections(server):
+    transport = Transport()
+
+    for _ in range(3):
+        assert transport.request("post", server.format("1:t", "sendMessage")).json()["ok"]
+
+    assert transport.metrics == TransportMetrics(requests=3, errors=0, connections=1, reused=2)
+
+
+def test_metrics_count_errors(server):
+    transport = Transport(TransportConfig(connect_timeout=1))
+
+    # Nothing listens on port 9 (discard) locally
+    with pytest.raises(requests.ConnectionError):
+        transport.request("post", "http://127.0.0.1:9/bot1:t/sendMessage")
+
+    assert transport.metrics.requests == 1
+    assert transport.metrics.errors == 1
+
+
+def test_install_routes_telebot_calls(server, monkeypatch):
+    monkeypatch.setattr(apihelper, "CUSTOM_REQUEST_SENDER", None)
+    monkeypatch.setattr(apihelper, "API_URL", apihelper.API_URL)
+    transport = Transport(TransportConfig(api_url=server))
+    timeouts = recording(transport)
+    transport.install()
+
+    bot = TeleBot("1:t", threaded=False)
+    bot.send_message(1, "hi")
+    bot.send_message(1, "hi", timeout=7)
+
+    assert transport.metrics.requests == 2
+    assert timeouts[0] == (transport.config.connect_timeout, transport.config.read_timeout)
+    assert timeouts[1] == (7, 7)